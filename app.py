@@ -1,8 +1,11 @@
+import bisect
 import sqlite3
+import threading
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-from datetime import datetime, timedelta
+from datetime import datetime
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
@@ -15,7 +18,19 @@ XP_PER_HOUR = 10
 STREAK_BONUS = 5
 LEVEL_UP_XP = [0, 100, 250, 500, 1000, 2000, 3500, 5000, 7500, 10000]  # XP needed for each level
 
-def connect():
+def _tune(conn):
+    # NORMAL is durable enough under WAL and skips an fsync per commit;
+    # keep temp tables in memory, use an ~8MB page cache and mmap reads
+    try:
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-8000")
+        conn.execute("PRAGMA mmap_size=268435456")
+    except sqlite3.OperationalError:
+        pass
+
+@st.cache_resource
+def get_writer():
     conn = sqlite3.connect(DB_NAME, timeout=10.0, check_same_thread=False)
     # Try to enable WAL mode, but don't fail if database is locked
     try:
@@ -24,64 +39,150 @@ def connect():
     except sqlite3.OperationalError:
         # If WAL can't be set, continue with default mode
         pass
+    _tune(conn)
+    return conn
+
+@st.cache_resource
+def get_write_lock():
+    # Streamlit re-executes this file on every rerun, so a module-level lock would be
+    # recreated each time; cache it next to the shared writer so all sessions use one
+    return threading.Lock()
+
+@st.cache_resource
+def get_reader():
+    # Read-only; under WAL it reads alongside the writer instead of waiting on it.
+    # Opened after create_table(), which makes sure the database file exists
+    conn = sqlite3.connect(f"file:{DB_NAME}?mode=ro", uri=True, timeout=10.0, check_same_thread=False)
+    _tune(conn)
     return conn
 
 def create_table():
-    conn = connect()
-    try:
+    conn = get_writer()
+    with get_write_lock():
         cursor = conn.cursor()
+        try:
+            # Seed social_media only on first run so a plain rerun doesn't open a write
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='habits'")
+            new_database = cursor.fetchone() is None
 
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS habit_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT,
-                social_media REAL DEFAULT 0
-            );
-        """)
-
-        # Create gamification table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS gamification (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                total_xp INTEGER DEFAULT 0,
-                current_level INTEGER DEFAULT 1,
-                badges TEXT DEFAULT '',
-                last_updated TEXT
-            );
-        """)
-        
-        # Initialize gamification if empty
-        cursor.execute("SELECT COUNT(*) FROM gamification")
-        if cursor.fetchone()[0] == 0:
-            cursor.execute("INSERT INTO gamification (total_xp, current_level, badges, last_updated) VALUES (0, 1, '', ?)", 
-                          (datetime.now().strftime("%Y-%m-%d"),))
+            # One row per habit, in creation order (rowid)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS habits (
+                    name TEXT PRIMARY KEY COLLATE NOCASE
+                );
+            """)
 
-        conn.commit()
-    finally:
-        conn.close()
+            # One row per (date, habit) instead of one column per habit
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    date TEXT NOT NULL,
+                    habit TEXT NOT NULL,
+                    hours REAL DEFAULT 0,
+                    PRIMARY KEY (date, habit)
+                );
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_entries_habit_date ON entries (habit, date)")
+            if new_database:
+                cursor.execute("INSERT OR IGNORE INTO habits (name) VALUES ('social_media')")
+
+            # Databases from before the entries table still have the wide habit_log table
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='habit_log'")
+            migrated = cursor.fetchone() is not None
+            if migrated:
+                migrate_habit_log(cursor)
+
+            # Create gamification table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS gamification (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    total_xp INTEGER DEFAULT 0,
+                    current_level INTEGER DEFAULT 1,
+                    badges TEXT DEFAULT '',
+                    last_updated TEXT
+                );
+            """)
+    
+            # Initialize gamification if empty
+            cursor.execute("SELECT COUNT(*) FROM gamification")
+            if cursor.fetchone()[0] == 0:
+                cursor.execute("INSERT INTO gamification (total_xp, current_level, badges, last_updated) VALUES (0, 1, '', ?)", 
+                              (datetime.now().strftime("%Y-%m-%d"),))
+
+            # One row per earned badge, in the order they were earned (rowid)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS badges (
+                    name TEXT PRIMARY KEY,
+                    earned_at TEXT
+                );
+            """)
+
+            # Move badges still stored as a comma-joined string on gamification
+            cursor.execute("SELECT badges, last_updated FROM gamification WHERE badges != ''")
+            legacy_badges = cursor.fetchall()
+            for badges, earned_at in legacy_badges:
+                cursor.executemany("INSERT OR IGNORE INTO badges (name, earned_at) VALUES (?, ?)",
+                                   [(badge, earned_at) for badge in badges.split(",") if badge])
+            if legacy_badges:
+                cursor.execute("UPDATE gamification SET badges = '' WHERE badges != ''")
 
-def update_csv():
-    conn = connect()
-    try:
-        df = pd.read_sql_query("SELECT * FROM habit_log ORDER BY date", conn)
-    finally:
-        conn.close()
-    df.to_csv(CSV_NAME, index=False)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    # Only after the commit, so the reader can't re-cache the old habit list
+    if migrated:
+        invalidate_habits()
+        _load_log.clear()
+        _csv_bytes.clear()
+
+def migrate_habit_log(cursor):
+    """Copy the old one-column-per-habit habit_log table into habits/entries"""
+    cursor.execute("SELECT * FROM habit_log WHERE date IS NOT NULL")
+    columns = [col[0] for col in cursor.description]
+    old_rows = cursor.fetchall()
+    habits = [(i, col) for i, col in enumerate(columns) if col not in ("id", "date")]
+    date_index = columns.index("date")
+
+    cursor.executemany("INSERT OR IGNORE INTO habits (name) VALUES (?)", [(h,) for _, h in habits])
+    cursor.executemany(
+        "INSERT OR IGNORE INTO entries (date, habit, hours) VALUES (?, ?, ?)",
+        [(row[date_index], habit, 0.0 if row[i] is None else row[i])
+         for row in old_rows for i, habit in habits]
+    )
+
+    # Keep the old table around rather than dropping user data. APP.ipynb still
+    # creates habit_log, so an earlier backup may already hold the plain name.
+    cursor.execute("SELECT name FROM sqlite_master WHERE name LIKE 'habit_log_old%'")
+    taken = {row[0] for row in cursor.fetchall()}
+    backup, n = "habit_log_old", 1
+    while backup in taken:
+        n += 1
+        backup = f"habit_log_old_{n}"
+    cursor.execute(f"ALTER TABLE habit_log RENAME TO {backup}")
 
 def add_habit(habit_name):
     habit = habit_name.strip().replace(" ", "_")
-
-    conn = connect()
-    try:
-        cursor = conn.cursor()
-        cursor.execute(f"ALTER TABLE habit_log ADD COLUMN {habit} REAL DEFAULT 0;")
-        conn.commit()
-        update_csv()
-        return True, f"🎉 Habit '{habit}' added!"
-    except sqlite3.OperationalError:
+    # Habit names become DataFrame columns and widget keys
+    if not habit.isidentifier() or habit.lower() in ("id", "date"):
         return False, "⚠️ Habit already exists or invalid name."
-    finally:
-        conn.close()
+
+    conn = get_writer()
+    with get_write_lock():
+        try:
+            conn.execute("INSERT INTO habits (name) VALUES (?)", (habit,))
+            conn.commit()
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return False, "⚠️ Habit already exists or invalid name."
+        except Exception:
+            conn.rollback()
+            raise
+
+    invalidate_habits()
+    _load_log.clear()
+    _csv_bytes.clear()
+    return True, f"🎉 Habit '{habit}' added!"
 
 def add_entry(date_str, habit_values):
     try:
@@ -89,212 +190,218 @@ def add_entry(date_str, habit_values):
     except ValueError:
         return False, "❗ Invalid date format."
 
-    conn = connect()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute("PRAGMA table_info(habit_log);")
-        columns = [col[1] for col in cursor.fetchall() if col[1] != "id"]
-
-        # Check if entry exists for this date
-        cursor.execute("SELECT 1 FROM habit_log WHERE date=?", (date_str,))
-        entry_exists = cursor.fetchone() is not None
-
-        if entry_exists:
-            # For updates: only update habits with values > 0, keep others as they were
-            # First, get existing values
-            cursor.execute(f"SELECT * FROM habit_log WHERE date=?", (date_str,))
-            existing_row = cursor.fetchone()
-            existing_dict = {}
-            if existing_row:
-                for i, col in enumerate(columns):
-                    existing_dict[col] = existing_row[i + 1]  # +1 to skip id column
-            
-            # Build update statement - update habits that have new values
-            # For social_media, always update if provided (even if 0) to track and penalize usage
-            # For other habits, only update if value > 0
-            update_parts = []
-            update_values = []
-            for col in columns:
-                if col == "date":
-                    continue
-                if col in habit_values:
-                    if col == "social_media":
-                        # Always update social_media if provided (to track any usage, even small amounts)
-                        update_parts.append(f"{col} = ?")
-                        update_values.append(habit_values[col])
-                    elif habit_values[col] > 0:
-                        # For other habits, only update if value > 0
-                        update_parts.append(f"{col} = ?")
-                        update_values.append(habit_values[col])
-                # If habit not in habit_values or value is 0 (for non-social_media), keep existing value
-            
-            if update_parts:
-                update_values.append(date_str)
-                cursor.execute(f"UPDATE habit_log SET {', '.join(update_parts)} WHERE date = ?", update_values)
-                message = f"✅ Entry updated for {date_str}!"
+    conn = get_writer()
+    with get_write_lock():
+        cursor = conn.cursor()
+        try:
+            habits = get_habits()
+            known_habits = frozenset(habits)
+
+            # Check if entry exists for this date
+            cursor.execute("SELECT 1 FROM entries WHERE date = ? LIMIT 1", (date_str,))
+            entry_exists = cursor.fetchone() is not None
+
+            # Nothing to store or score, so skip the write, streak query and XP update.
+            # An existing entry still takes social_media, so it can be corrected back to 0.
+            if not any(v > 0 for v in habit_values.values()) and (
+                    not entry_exists or "social_media" not in habit_values):
+                return None, "ℹ️ No hours entered."
+
+            if entry_exists:
+                # For updates: only update habits with values > 0, keep others as they were
+                # For social_media, always update if provided (even if 0) to track and penalize usage
+                rows = [(date_str, habit, hours) for habit, hours in habit_values.items()
+                        if habit in known_habits and (habit == "social_media" or hours > 0)]
+                if rows:
+                    message = f"✅ Entry updated for {date_str}!"
+                else:
+                    message = f"ℹ️ Entry for {date_str} exists. No new values to update."
             else:
-                message = f"ℹ️ Entry for {date_str} exists. No new values to update."
-        else:
-            # Insert new entry - use provided values or 0
-            values = {"date": date_str}
-            for col in columns:
-                if col == "date":
-                    continue
-                values[col] = habit_values.get(col, 0.0)
-            
-            col_names = ", ".join(values.keys())
-            placeholders = ", ".join(["?"] * len(values))
-            cursor.execute(f"INSERT INTO habit_log ({col_names}) VALUES ({placeholders})", list(values.values()))
-            message = f"✅ Entry added for {date_str}!"
+                # Insert new entry - use provided values or 0
+                rows = [(date_str, habit, habit_values.get(habit, 0.0)) for habit in habits]
+                message = f"✅ Entry added for {date_str}!"
+
+            cursor.executemany("""
+                INSERT INTO entries (date, habit, hours) VALUES (?, ?, ?)
+                ON CONFLICT (date, habit) DO UPDATE SET hours = excluded.hours
+            """, rows)
+
+            # Calculate XP in the same transaction so the entry and its XP commit together
+            # Use habit_values directly - these are the values the user entered and were just written
+    
+            # Good habits add XP, social_media reduces XP (from 0 hours, any value > 0 reduces XP)
+            good_habits_hours = sum(v for k, v in habit_values.items() if k != "social_media" and v > 0)
+            # Get social_media hours - use the value from habit_values if provided, otherwise 0
+            social_media_hours = habit_values.get("social_media", 0)
+    
+            # Calculate XP - social media reduces XP for ANY hours > 0 (even 0.1 hours = 1 XP lost)
+            # Use round() to handle fractional hours properly
+            xp_from_good_habits = round(good_habits_hours * XP_PER_HOUR)
+            xp_lost_from_social_media = round(social_media_hours * XP_PER_HOUR) if social_media_hours > 0 else 0
+    
+            # Calculate base XP (good habits minus social media penalty)
+            xp_earned = xp_from_good_habits - xp_lost_from_social_media
+    
+            # Add streak bonus ONLY for good habits that were actually logged in this entry
+            # Only count streaks for habits that have hours > 0 in this entry
+            if good_habits_hours > 0:
+                streaks = calculate_streaks_dict(cursor)
+                # Only get streak bonus for habits that were logged in this entry
+                logged_habits = [k for k, v in habit_values.items() if k != "social_media" and v > 0]
+                streak_bonus = 0
+                for habit in logged_habits:
+                    if habit in streaks and streaks[habit] > 0:
+                        # Add bonus based on streak length (max 7 days = 35 bonus XP per habit)
+                        streak_bonus += min(streaks[habit], 7) * STREAK_BONUS
+                xp_earned += streak_bonus
+    
+            # Update XP - can be positive or negative
+            # Always update if there's any XP change OR if social media was used (even if net is 0)
+            if xp_earned != 0:
+                update_xp(xp_earned, cursor)
+                if xp_earned > 0:
+                    message += f" Earned {xp_earned} XP! 🎮"
+                else:
+                    message += f" Lost {abs(xp_earned)} XP from social media 😔"
+            elif social_media_hours > 0:
+                # Social media was used but net XP is 0 (good habits canceled it out)
+                # Still update to record the entry, and show the loss
+                update_xp(xp_earned, cursor)  # This will be 0, but we still update to record
+                if xp_from_good_habits > 0:
+                    message += f" Social media canceled out {xp_lost_from_social_media} XP 😔"
+                else:
+                    message += f" Lost {xp_lost_from_social_media} XP from social media 😔"
 
-        conn.commit()
-    finally:
-        conn.close()
-
-    # Calculate and update XP (after closing the connection)
-    # Use habit_values directly - these are the values the user entered and were just saved
-    
-    # Good habits add XP, social_media reduces XP (from 0 hours, any value > 0 reduces XP)
-    good_habits_hours = sum(v for k, v in habit_values.items() if k != "social_media" and v > 0)
-    # Get social_media hours - use the value from habit_values if provided, otherwise 0
-    social_media_hours = habit_values.get("social_media", 0)
-    
-    # Calculate XP - social media reduces XP for ANY hours > 0 (even 0.1 hours = 1 XP lost)
-    # Use round() to handle fractional hours properly
-    xp_from_good_habits = round(good_habits_hours * XP_PER_HOUR)
-    xp_lost_from_social_media = round(social_media_hours * XP_PER_HOUR) if social_media_hours > 0 else 0
-    
-    # Calculate base XP (good habits minus social media penalty)
-    xp_earned = xp_from_good_habits - xp_lost_from_social_media
-    
-    # Add streak bonus ONLY for good habits that were actually logged in this entry
-    # Only count streaks for habits that have hours > 0 in this entry
-    if good_habits_hours > 0:
-        streaks = calculate_streaks_dict()
-        # Only get streak bonus for habits that were logged in this entry
-        logged_habits = [k for k, v in habit_values.items() if k != "social_media" and v > 0]
-        streak_bonus = 0
-        for habit in logged_habits:
-            if habit in streaks and streaks[habit] > 0:
-                # Add bonus based on streak length (max 7 days = 35 bonus XP per habit)
-                streak_bonus += min(streaks[habit], 7) * STREAK_BONUS
-        xp_earned += streak_bonus
-    
-    # Update XP (separate connection) - can be positive or negative
-    # Always update if there's any XP change OR if social media was used (even if net is 0)
-    if xp_earned != 0:
-        update_xp(xp_earned)
-        if xp_earned > 0:
-            message += f" Earned {xp_earned} XP! 🎮"
-        else:
-            message += f" Lost {abs(xp_earned)} XP from social media 😔"
-    elif social_media_hours > 0:
-        # Social media was used but net XP is 0 (good habits canceled it out)
-        # Still update to record the entry, and show the loss
-        update_xp(xp_earned)  # This will be 0, but we still update to record
-        if xp_from_good_habits > 0:
-            message += f" Social media canceled out {xp_lost_from_social_media} XP 😔"
-        else:
-            message += f" Lost {xp_lost_from_social_media} XP from social media 😔"
-    
-    # Update CSV
-    update_csv()
+            conn.commit()
+        except Exception:
+            # The connection is shared, so don't leave a half-written entry pending
+            conn.rollback()
+            raise
+
+    _load_log.clear()
+    _csv_bytes.clear()
 
     return True, message
 
+@st.cache_data(ttl=300)
+def _load_log(version):
+    # version is (row count, latest date) and only serves as the cache key;
+    # writers call _load_log.clear() for changes it can't see
+    cursor = get_reader().cursor()
+    cursor.execute("SELECT date, habit, hours FROM entries")
+    rows = cursor.fetchall()
+    entry_dates, entry_habits, entry_hours = zip(*rows) if rows else ((), (), ())
+
+    # Scatter the rows straight into a date x habit array instead of going
+    # through read_sql_query and pivot; NumPy parses the ISO dates itself
+    habits = get_habits()
+    habit_index = {habit: i for i, habit in enumerate(habits)}
+    dates, date_rows = np.unique(np.array(entry_dates, dtype="datetime64[D]"), return_inverse=True)
+    habit_cols = np.array([habit_index.get(h, -1) for h in entry_habits], dtype=np.intp)
+    known = habit_cols >= 0
+
+    # Hours are within [0, 24], so float32 is plenty and halves the memory reductions touch
+    hours = np.zeros((len(dates), len(habits)), dtype=np.float32)
+    hours[date_rows[known], habit_cols[known]] = np.array(
+        [h or 0.0 for h in entry_hours], dtype=np.float32)[known]
+
+    df = pd.DataFrame(hours, columns=habits)
+    df.insert(0, "date", dates.astype("datetime64[ns]"))
+    return df
+
+def log_version():
+    cursor = get_reader().cursor()
+    cursor.execute("SELECT COUNT(*), MAX(date) FROM entries")
+    return cursor.fetchone()
+
+def load_log():
+    return _load_log(log_version())
+
+@st.cache_data(ttl=300)
+def _csv_bytes(version):
+    # Same key and invalidation as _load_log, so every session gets the current data
+    return _load_log(version).to_csv(index=False).encode()
+
+@st.cache_resource
+def _habit_cache():
+    # Ordered habit names, shared by all sessions and reruns until add_habit()
+    # or a migration resets them; handed out as-is, not copied like st.cache_data
+    return {"lock": threading.Lock(), "names": None}
+
 def get_habits():
-    conn = connect()
-    try:
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA table_info(habit_log);")
-        columns = [col[1] for col in cursor.fetchall() if col[1] not in ("id", "date")]
-        return columns
-    finally:
-        conn.close()
+    cache = _habit_cache()
+    with cache["lock"]:
+        if cache["names"] is None:
+            cursor = get_reader().cursor()
+            cursor.execute("SELECT name FROM habits ORDER BY rowid")
+            cache["names"] = tuple(row[0] for row in cursor.fetchall())
+        return cache["names"]
+
+def invalidate_habits():
+    cache = _habit_cache()
+    with cache["lock"]:
+        cache["names"] = None
 
 def view_table():
-    conn = connect()
-    try:
-        df = pd.read_sql_query("SELECT * FROM habit_log ORDER BY date", conn)
-        return df
-    finally:
-        conn.close()
-
-def calculate_streaks_dict():
-    conn = connect()
-    try:
-        df = pd.read_sql_query("SELECT * FROM habit_log ORDER BY date", conn)
-    finally:
-        conn.close()
-
-    if df.empty:
+    return load_log()
+
+def calculate_streaks_dict(cursor=None):
+    # add_entry() passes the writer's cursor so its uncommitted entry is counted
+    if cursor is None:
+        cursor = get_reader().cursor()
+    cursor.execute("SELECT julianday(MAX(date)) FROM entries")
+    latest = cursor.fetchone()[0]
+    if latest is None:
         return {}
 
-    df["date"] = pd.to_datetime(df["date"])
-
-    streaks = {}
     # Exclude social_media from streaks as it's not a good habit
-    habit_cols = [c for c in df.columns if c not in ("id", "date", "social_media")]
-
-    for habit in habit_cols:
-        habit_df = df[["date", habit]].sort_values("date", ascending=False)
-        streak = 0
-        if len(habit_df) > 0:
-            expected = habit_df.iloc[0]["date"]
-
-            for _, row in habit_df.iterrows():
-                if row["date"] == expected and row[habit] > 0:
-                    streak += 1
-                    expected -= timedelta(days=1)
-                else:
-                    break
-
-        streaks[habit] = streak
+    streaks = {habit: 0 for habit in get_habits() if habit != "social_media"}
+
+    # Walking back from the latest date, day + row number stays at latest + 1
+    # for as long as the logged days are consecutive
+    cursor.execute("""
+        SELECT habit, COUNT(*) FROM (
+            SELECT habit, julianday(date) + ROW_NUMBER() OVER (
+                PARTITION BY habit ORDER BY date DESC
+            ) AS grp
+            FROM entries
+            WHERE hours > 0 AND habit != 'social_media'
+        )
+        WHERE grp = ? + 1
+        GROUP BY habit
+    """, (latest,))
+    streaks.update(cursor.fetchall())
 
     return streaks
 
-def update_xp(xp_earned):
-    conn = connect()
-    cursor = conn.cursor()
+def update_xp(xp_earned, cursor):
+    # Runs on the caller's cursor; the caller owns the commit
+    cursor.execute("SELECT total_xp, current_level FROM gamification ORDER BY id DESC LIMIT 1")
+    result = cursor.fetchone()
     
-    try:
-        cursor.execute("SELECT total_xp, current_level FROM gamification ORDER BY id DESC LIMIT 1")
-        result = cursor.fetchone()
+    if result:
+        current_xp, current_level = result
+        new_xp = max(0, current_xp + xp_earned)  # Ensure XP doesn't go below 0
         
-        if result:
-            current_xp, current_level = result
-            new_xp = max(0, current_xp + xp_earned)  # Ensure XP doesn't go below 0
-            
-            # Calculate new level based on XP (can go down if XP decreases)
-            new_level = 1
-            for i, xp_threshold in enumerate(LEVEL_UP_XP):
-                if new_xp >= xp_threshold:
-                    new_level = i + 1
-                else:
-                    break
-            
-            cursor.execute("""
-                UPDATE gamification 
-                SET total_xp = ?, current_level = ?, last_updated = ?
-                WHERE id = (SELECT MAX(id) FROM gamification)
-            """, (new_xp, new_level, datetime.now().strftime("%Y-%m-%d")))
-            
-            conn.commit()
-    finally:
-        conn.close()
+        # Calculate new level based on XP (can go down if XP decreases)
+        # Level = number of thresholds reached (LEVEL_UP_XP is sorted, starts at 0)
+        new_level = bisect.bisect_right(LEVEL_UP_XP, new_xp)
+        
+        cursor.execute("""
+            UPDATE gamification 
+            SET total_xp = ?, current_level = ?, last_updated = ?
+            WHERE id = (SELECT MAX(id) FROM gamification)
+        """, (new_xp, new_level, datetime.now().strftime("%Y-%m-%d")))
 
 def get_gamification_stats():
-    conn = connect()
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT total_xp, current_level, badges FROM gamification ORDER BY id DESC LIMIT 1")
-        result = cursor.fetchone()
-    finally:
-        conn.close()
+    cursor = get_reader().cursor()
+    cursor.execute("SELECT total_xp, current_level FROM gamification ORDER BY id DESC LIMIT 1")
+    result = cursor.fetchone()
+    cursor.execute("SELECT name FROM badges ORDER BY rowid")
+    badges = [row[0] for row in cursor.fetchall()]
     
     if result:
-        total_xp, level, badges = result
+        total_xp, level = result
         # Calculate XP for current level and next level
         current_level_xp = LEVEL_UP_XP[level - 1] if level > 0 else 0
         next_level_xp = LEVEL_UP_XP[level] if level < len(LEVEL_UP_XP) else LEVEL_UP_XP[-1]
@@ -304,7 +411,7 @@ def get_gamification_stats():
         return {
             "total_xp": total_xp,
             "level": level,
-            "badges": badges.split(",") if badges else [],
+            "badges": badges,
             "xp_progress": xp_progress,
             "xp_needed": xp_needed,
             "progress_percent": min(100, (xp_progress / xp_needed * 100) if xp_needed > 0 else 100)
@@ -312,80 +419,78 @@ def get_gamification_stats():
     return {
         "total_xp": 0,
         "level": 1,
-        "badges": [],
+        "badges": badges,
         "xp_progress": 0,
         "xp_needed": 100,
         "progress_percent": 0
     }
 
-def check_achievements():
+def check_achievements(stats, streaks):
     """Check and award achievements based on user progress"""
-    conn = connect()
-    try:
-        df = pd.read_sql_query("SELECT * FROM habit_log", conn)
-    finally:
-        conn.close()
+    df = load_log()
     
     if df.empty:
         return []
     
     achievements = []
-    streaks = calculate_streaks_dict()
-    stats = get_gamification_stats()
+    badge_set = set(stats["badges"])
     
     # Streak achievements (only for good habits, not social_media)
     good_habit_streaks = {k: v for k, v in streaks.items() if k != "social_media"}
     max_streak = max(good_habit_streaks.values()) if good_habit_streaks else 0
-    if max_streak >= 7 and "🔥 7-Day Streak" not in stats["badges"]:
+    if max_streak >= 7 and "🔥 7-Day Streak" not in badge_set:
         achievements.append("🔥 7-Day Streak")
-    if max_streak >= 30 and "💪 30-Day Streak" not in stats["badges"]:
+    if max_streak >= 30 and "💪 30-Day Streak" not in badge_set:
         achievements.append("💪 30-Day Streak")
-    if max_streak >= 100 and "👑 100-Day Streak" not in stats["badges"]:
+    if max_streak >= 100 and "👑 100-Day Streak" not in badge_set:
         achievements.append("👑 100-Day Streak")
     
     # Level achievements
-    if stats["level"] >= 5 and "⭐ Level 5" not in stats["badges"]:
+    if stats["level"] >= 5 and "⭐ Level 5" not in badge_set:
         achievements.append("⭐ Level 5")
-    if stats["level"] >= 10 and "🌟 Level 10" not in stats["badges"]:
+    if stats["level"] >= 10 and "🌟 Level 10" not in badge_set:
         achievements.append("🌟 Level 10")
     
     # Total hours achievements (only for good habits, not social_media)
-    good_habit_cols = [c for c in df.columns if c not in ("id", "date", "social_media")]
-    total_good_hours = df[good_habit_cols].sum().sum() if good_habit_cols else 0
-    if total_good_hours >= 100 and "📚 100 Hours" not in stats["badges"]:
+    good_habit_cols = [c for c in df.columns if c not in ("date", "social_media")]
+    total_good_hours = float(df[good_habit_cols].to_numpy().sum()) if good_habit_cols else 0
+    if total_good_hours >= 100 and "📚 100 Hours" not in badge_set:
         achievements.append("📚 100 Hours")
-    if total_good_hours >= 500 and "🎓 500 Hours" not in stats["badges"]:
+    if total_good_hours >= 500 and "🎓 500 Hours" not in badge_set:
         achievements.append("🎓 500 Hours")
     
     # Update badges if new achievements
     if achievements:
-        conn = connect()
-        try:
-            cursor = conn.cursor()
-            current_badges = stats["badges"]
-            all_badges = list(set(current_badges + achievements))
-            cursor.execute("""
-                UPDATE gamification 
-                SET badges = ?
-                WHERE id = (SELECT MAX(id) FROM gamification)
-            """, (",".join(all_badges),))
-            conn.commit()
-        finally:
-            conn.close()
+        conn = get_writer()
+        with get_write_lock():
+            try:
+                # Only the new badges are written; ones already earned keep their row
+                conn.executemany("INSERT OR IGNORE INTO badges (name, earned_at) VALUES (?, date('now'))",
+                                 [(badge,) for badge in achievements])
+                conn.commit()
+            except Exception:
+                # The connection is shared, so don't leave a half-written insert pending
+                conn.rollback()
+                raise
     
     return achievements
 
-def create_pie_chart():
-    conn = connect()
-    try:
-        df = pd.read_sql_query("SELECT * FROM habit_log", conn)
-    finally:
-        conn.close()
-
+def compute_dashboard():
+    """Load stats and streaks once per rerun and award any new achievements"""
+    stats = get_gamification_stats()
+    streaks = calculate_streaks_dict()
+    achievements = check_achievements(stats, streaks)
+    return stats, streaks, achievements
+
+# Charts take the loaded log and are cached on its contents, so reruns
+# with unchanged data reuse the figure instead of rebuilding it. Every write
+# makes a new key, so entries expire like _load_log and the count is capped
+@st.cache_data(ttl=300, max_entries=20)
+def create_pie_chart(df):
     if df.empty:
         return None
 
-    habit_cols = [c for c in df.columns if c not in ("id", "date")]
+    habit_cols = [c for c in df.columns if c != "date"]
     totals = df[habit_cols].sum()
     
     fig = px.pie(values=totals.values, names=totals.index, 
@@ -393,18 +498,11 @@ def create_pie_chart():
                  color_discrete_sequence=px.colors.qualitative.Set3)
     return fig
 
-def create_bar_chart(habit):
-    conn = connect()
-    try:
-        df = pd.read_sql_query("SELECT * FROM habit_log ORDER BY date", conn)
-    finally:
-        conn.close()
-
+@st.cache_data(ttl=300, max_entries=20)
+def create_bar_chart(df, habit):
     if habit not in df.columns:
         return None
 
-    df["date"] = pd.to_datetime(df["date"])
-    
     fig = px.bar(df, x="date", y=habit, 
                  title=f"📊 Time Spent on {habit} Over Time",
                  labels={"date": "Date", habit: "Hours"},
@@ -413,22 +511,17 @@ def create_bar_chart(habit):
     fig.update_layout(xaxis_tickangle=-45)
     return fig
 
-def create_comparison_chart():
-    conn = connect()
-    try:
-        df = pd.read_sql_query("SELECT * FROM habit_log", conn)
-    finally:
-        conn.close()
-
+@st.cache_data(ttl=300, max_entries=20)
+def create_comparison_chart(df):
     if df.empty:
         return None
 
-    df["date"] = pd.to_datetime(df["date"])
-    habit_cols = [c for c in df.columns if c not in ("id", "date", "social_media")]
-    df['total_habit_time'] = df[habit_cols].sum(axis=1)
+    habit_cols = [c for c in df.columns if c not in ("date", "social_media")]
+    # Don't add a column to df: it's the caller's frame, not a cached copy
+    total_habit_time = df[habit_cols].sum(axis=1)
 
     fig = go.Figure()
-    fig.add_trace(go.Bar(x=df['date'], y=df['total_habit_time'], 
+    fig.add_trace(go.Bar(x=df['date'], y=total_habit_time, 
                         name='Total Habit Time', marker_color='#2ecc71'))
     fig.add_trace(go.Bar(x=df['date'], y=df['social_media'], 
                         name='Social Media', marker_color='#e74c3c', opacity=0.7))
@@ -487,9 +580,8 @@ def main():
     # Header
     st.markdown('<h1 class="main-header">🎮 Gamified Habit Tracker</h1>', unsafe_allow_html=True)
     
-    # Get gamification stats
-    stats = get_gamification_stats()
-    achievements = check_achievements()
+    # Get gamification stats, streaks and new achievements in one pass
+    stats, streaks, achievements = compute_dashboard()
     
     # Show new achievements
     if achievements:
@@ -559,6 +651,8 @@ def main():
                     st.success(message)
                     st.balloons()
                     st.rerun()
+                elif success is None:
+                    st.info(message)
                 else:
                     st.error(message)
     
@@ -587,20 +681,25 @@ def main():
         else:
             # Display table
             st.subheader("📋 All Entries")
-            display_df = df.drop(columns=["id"] if "id" in df.columns else [])
-            st.dataframe(display_df, use_container_width=True, hide_index=True)
+            st.dataframe(df, use_container_width=True, hide_index=True,
+                         column_config={"date": st.column_config.DateColumn("date", format="YYYY-MM-DD")})
+            # Only rebuilt when the data has changed since the last download was built
+            st.download_button("⬇️ Download CSV", data=_csv_bytes(log_version()),
+                               file_name=CSV_NAME, mime="text/csv")
             
             # Quick stats
             st.subheader("📈 Quick Statistics")
-            habit_cols = [c for c in df.columns if c not in ("id", "date")]
+            habit_cols = [c for c in df.columns if c != "date"]
             
             if habit_cols:
                 col1, col2, col3, col4 = st.columns(4)
                 
-                total_hours = df[habit_cols].sum().sum()
+                # One reduction over the raw array, reused for both metrics
+                habit_totals = df[habit_cols].to_numpy().sum(axis=0)
+                total_hours = float(habit_totals.sum())
                 total_days = len(df)
                 avg_daily = total_hours / total_days if total_days > 0 else 0
-                active_habits = sum(1 for col in habit_cols if df[col].sum() > 0)
+                active_habits = int((habit_totals > 0).sum())
                 
                 with col1:
                     st.metric("📚 Total Hours", f"{total_hours:.1f}")
@@ -614,8 +713,6 @@ def main():
     elif page == "🔥 Streaks":
         st.header("🔥 Your Streaks")
         
-        streaks = calculate_streaks_dict()
-        
         if not streaks:
             st.info("📝 No streaks yet. Start logging to build your streaks!")
         else:
@@ -664,7 +761,7 @@ def main():
         else:
             # Pie chart
             st.subheader("🎯 Time Distribution")
-            pie_fig = create_pie_chart()
+            pie_fig = create_pie_chart(df)
             if pie_fig:
                 st.plotly_chart(pie_fig, use_container_width=True)
             
@@ -673,14 +770,14 @@ def main():
             if habits:
                 st.subheader("📊 Individual Habit Progress")
                 selected_habit = st.selectbox("Select a habit to view:", habits)
-                bar_fig = create_bar_chart(selected_habit)
+                bar_fig = create_bar_chart(df, selected_habit)
                 if bar_fig:
                     st.plotly_chart(bar_fig, use_container_width=True)
             
             # Comparison chart
             if "social_media" in df.columns:
                 st.subheader("⚖️ Habit Time vs Social Media")
-                comp_fig = create_comparison_chart()
+                comp_fig = create_comparison_chart(df)
                 if comp_fig:
                     st.plotly_chart(comp_fig, use_container_width=True)
 